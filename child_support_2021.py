@@ -25,12 +25,19 @@ Copyright:
 """
 from __future__ import annotations
 
-from dataclasses import dataclass, asdict
-from typing import List, Optional, Dict, Any, Tuple
+from dataclasses import dataclass
+from functools import lru_cache
+from typing import List, Optional, Dict, Any, Callable, NamedTuple, Sequence, Tuple, Union
+from bisect import bisect_left
 import math
 import argparse
 import json
 
+try:  # optional: faster JSON output for the CLI
+    import orjson
+except ImportError:
+    orjson = None
+
 # -----------------------------------------------------------------------------
 # Data (extracted from the 2021 guideline table)
 # Income brackets are in 만원 (10,000 KRW) of combined pre-tax monthly income.
@@ -53,6 +60,9 @@ INCOME_BRACKETS_MW: List[Tuple[int, Optional[int]]] = [
     (1200, None),
 ]
 
+# Finite upper bounds (만원) of INCOME_BRACKETS_MW, for binary search; anything above maps to the last bracket.
+_BRACKET_HI_MW: Tuple[int, ...] = tuple(hi for _, hi in INCOME_BRACKETS_MW if hi is not None)
+
 AGE_BRACKETS: List[Tuple[int, int, str]] = [
     (0, 2, "0~2세"),
     (3, 5, "3~5세"),
@@ -62,6 +72,12 @@ AGE_BRACKETS: List[Tuple[int, int, str]] = [
     (15, 18, "15~18세"),
 ]
 
+# Age bracket index for every supported age (0~18), so lookups are a single subscript.
+AGE_IDX_BY_YEAR: Tuple[int, ...] = tuple(
+    next(i for i, (a_min, a_max, _) in enumerate(AGE_BRACKETS) if a_min <= age <= a_max)
+    for age in range(AGE_BRACKETS[-1][1] + 1)
+)
+
 # Indexed by age_label -> income_bracket_index
 TABLE_2021: Dict[str, List[Dict[str, Optional[int]]]] = {
     "0~2세": [
@@ -144,21 +160,39 @@ TABLE_2021: Dict[str, List[Dict[str, Optional[int]]]] = {
     ],
 }
 
-# Child-count multiplier per guideline commentary:
+# Flat lookup tables derived from TABLE_2021, indexed by [age_bracket_index][income_bracket_index].
+# The open-ended high bound of the last income bracket stays None.
+AVG_2021: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(int(TABLE_2021[label][j]["avg"]) for j in range(len(INCOME_BRACKETS_MW)))
+    for _, _, label in AGE_BRACKETS
+)
+LOW_2021: Tuple[Tuple[int, ...], ...] = tuple(
+    tuple(int(TABLE_2021[label][j]["low"]) for j in range(len(INCOME_BRACKETS_MW)))
+    for _, _, label in AGE_BRACKETS
+)
+HIGH_2021: Tuple[Tuple[Optional[int], ...], ...] = tuple(
+    tuple(
+        None if TABLE_2021[label][j]["high"] is None else int(TABLE_2021[label][j]["high"])
+        for j in range(len(INCOME_BRACKETS_MW))
+    )
+    for _, _, label in AGE_BRACKETS
+)
+
+# Child-count multiplier per guideline commentary, as (numerator, denominator) so totals stay in integer KRW:
 # - baseline is 2 children (multiplier 1.0)
 # - 1 child -> 1.065
 # - 3+ children -> 0.783
-CHILD_COUNT_MULTIPLIERS = {
-    1: 1.065,
-    2: 1.0,
-    3: 0.783,  # for 3 or more
+CHILD_COUNT_MULT_FRAC: Dict[int, Tuple[int, int]] = {
+    1: (213, 200),
+    2: (1, 1),
+    3: (783, 1000),  # for 3 or more
 }
 
 # -----------------------------------------------------------------------------
 # Models
 # -----------------------------------------------------------------------------
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Adjustment:
     """
     Generic adjustment applied to the total standard child support.
@@ -173,11 +207,11 @@ class Adjustment:
     is_percent: bool = False
     notes: str = ""
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Child:
     age: int  # 만 나이
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class CalculationInputs:
     custodial_parent_income_krw: int  # pre-tax monthly
     non_custodial_parent_income_krw: int  # pre-tax monthly
@@ -186,9 +220,9 @@ class CalculationInputs:
     custodial_imputed_income_krw: Optional[int] = None
     non_custodial_imputed_income_krw: Optional[int] = None
     # Optional adjustments (asset situation, region, high medical/education, rehab, etc.)
-    adjustments: List[Adjustment] = None
+    adjustments: Optional[Sequence[Adjustment]] = ()
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class ChildCell:
     age_label: str
     income_bracket_mw: Tuple[int, Optional[int]]
@@ -196,7 +230,7 @@ class ChildCell:
     low_krw: int
     high_krw: Optional[int]
 
-@dataclass
+@dataclass(frozen=True, slots=True)
 class CalculationBreakdown:
     combined_income_krw: int
     combined_income_mw: int
@@ -213,40 +247,46 @@ class CalculationBreakdown:
 # Core functions
 # -----------------------------------------------------------------------------
 
+@lru_cache(maxsize=None)  # at most len(AGE_BRACKETS) x len(INCOME_BRACKETS_MW) entries
+def _cell_cached(age_idx: int, bracket_idx: int) -> ChildCell:
+    return ChildCell(
+        age_label=AGE_BRACKETS[age_idx][2],
+        income_bracket_mw=INCOME_BRACKETS_MW[bracket_idx],
+        avg_krw=AVG_2021[age_idx][bracket_idx],
+        low_krw=LOW_2021[age_idx][bracket_idx],
+        high_krw=HIGH_2021[age_idx][bracket_idx],
+    )
+
 class Guideline2021:
     @staticmethod
     def age_label_for(age: int) -> str:
-        for a_min, a_max, label in AGE_BRACKETS:
-            if a_min <= age <= a_max:
-                return label
-        raise ValueError(f"Child age out of supported range (0~18): {age}")
+        return AGE_BRACKETS[Guideline2021.age_idx_for(age)][2]
+
+    @staticmethod
+    def age_idx_for(age: int) -> int:
+        # Integral floats (e.g. 8.0 from JSON) are accepted; anything else is a ValueError.
+        if 0 <= age < len(AGE_IDX_BY_YEAR) and age == int(age):
+            return AGE_IDX_BY_YEAR[int(age)]
+        raise ValueError(f"Child age out of supported range (0~{len(AGE_IDX_BY_YEAR) - 1}): {age}")
 
     @staticmethod
     def income_bracket_index(combined_income_krw: int) -> int:
-        mw = combined_income_krw // 10_000
-        for idx, (lo, hi) in enumerate(INCOME_BRACKETS_MW):
-            if hi is None:
-                if mw >= lo:
-                    return idx
-            else:
-                if lo <= mw <= hi:
-                    return idx
-        # Should be unreachable
-        raise ValueError(f"Combined income not in any bracket: {combined_income_krw} KRW")
+        if combined_income_krw < 0:
+            raise ValueError(f"Combined income not in any bracket: {combined_income_krw} KRW")
+        return bisect_left(_BRACKET_HI_MW, combined_income_krw // 10_000)
 
     @staticmethod
     def cell(age: int, combined_income_krw: int) -> ChildCell:
-        label = Guideline2021.age_label_for(age)
-        idx = Guideline2021.income_bracket_index(combined_income_krw)
-        entry = TABLE_2021[label][idx]
-        return ChildCell(
-            age_label=label,
-            income_bracket_mw=INCOME_BRACKETS_MW[idx],
-            avg_krw=int(entry["avg"]),
-            low_krw=int(entry["low"]),
-            high_krw=None if entry["high"] is None else int(entry["high"]),
+        return _cell_cached(
+            Guideline2021.age_idx_for(age),
+            Guideline2021.income_bracket_index(combined_income_krw),
         )
 
+    @staticmethod
+    def cell_by_idx(age_idx: int, bracket_idx: int) -> ChildCell:
+        """Cell for already-resolved age bracket / income bracket indices (see age_idx_for, income_bracket_index)."""
+        return _cell_cached(age_idx, bracket_idx)
+
     @staticmethod
     def minimum_support_half(age: int) -> int:
         """
@@ -254,19 +294,52 @@ class Guideline2021:
         reason for no current income (e.g., disability/serious illness etc.) but some
         contribution is still considered. The commentary suggests "최저 양육비(하한)의 1/2".
         """
-        label = Guideline2021.age_label_for(age)
-        low = int(TABLE_2021[label][0]["low"])  # lowest income bracket lower bound
-        return low // 2
+        age_idx = Guideline2021.age_idx_for(age)
+        return LOW_2021[age_idx][0] // 2  # lowest income bracket lower bound
+
+def _adjustment_dict(a: Adjustment) -> Dict[str, Any]:
+    # Same keys as dataclasses.asdict(a), without its recursive deepcopy.
+    return {"name": a.name, "type": a.type, "value": a.value, "is_percent": a.is_percent, "notes": a.notes}
+
+def _mul_add(a: Adjustment) -> Tuple[Union[int, float], Union[int, float], str, Union[int, float]]:
+    """
+    (mul, add, audit_key, audit_value) for one adjustment: the total is folded as
+    total * mul + add. The neutral elements are ints so integer adjustments keep the
+    total in integer KRW.
+    """
+    # type(a.value) is part of the key so 1 and 1.0 (equal hashes) get separate entries.
+    return _mul_add_cached(a.type, bool(a.is_percent), type(a.value), a.value)
+
+@lru_cache(maxsize=256)
+def _mul_add_cached(
+    adj_type: str, is_percent: bool, value_type: type, value: Union[int, float]
+) -> Tuple[Union[int, float], Union[int, float], str, Union[int, float]]:
+    if adj_type == "multiplier":
+        if is_percent:
+            return 1 + value, 0, "effective_multiplier", 1.0 + value
+        return value, 0, "effective_multiplier", value
+    if adj_type == "add":
+        return 1, value, "effective_add_krw", value
+    if adj_type == "subtract":
+        return 1, -value, "effective_subtract_krw", value
+    raise ValueError(f"Unknown adjustment type: {adj_type}")
 
 def _safe_int(x: float) -> int:
-    return int(math.floor(x + 0.5))
+    # Round half up. int() truncation equals floor for the non-negative totals used here.
+    return int(x + 0.5) if x >= 0 else math.floor(x + 0.5)
 
-def calculate_child_support(inputs: CalculationInputs) -> CalculationBreakdown:
+def _round_div(num: int, den: int) -> int:
+    # Exact integer equivalent of _safe_int(num / den) for den > 0.
+    return (2 * num + den) // (2 * den)
+
+def calculate_child_support(inputs: CalculationInputs, *, include_cells: bool = True) -> CalculationBreakdown:
+    """
+    include_cells=False leaves standard_children_cells empty, for callers that only need
+    the totals / payment.
+    """
     if not inputs.children:
         raise ValueError("At least one child is required.")
 
-    adj = inputs.adjustments or []
-
     # Income imputation (optional)
     cust_income = inputs.custodial_parent_income_krw
     noncust_income = inputs.non_custodial_parent_income_krw
@@ -275,90 +348,212 @@ def calculate_child_support(inputs: CalculationInputs) -> CalculationBreakdown:
     if noncust_income <= 0 and inputs.non_custodial_imputed_income_krw is not None:
         noncust_income = inputs.non_custodial_imputed_income_krw
 
+    age_idx_for = Guideline2021.age_idx_for
+    age_idxs = [age_idx_for(child.age) for child in inputs.children]
+    return _calculate(cust_income, noncust_income, age_idxs, inputs.adjustments, include_cells)
+
+class _GuidelineAmounts(NamedTuple):
+    combined: int
+    bracket_idx: int
+    standard_total: int
+    child_count_mult: Tuple[int, int]  # (numerator, denominator)
+    adjusted_total: int
+    payment: int
+
+def _noncust_share(noncust_income: int, combined: int) -> float:
+    # Degenerate case: both 0. In practice, courts may impute income.
+    # Here we return 0 share (and 0 payment).
+    return 0.0 if combined == 0 else noncust_income / combined
+
+def _guideline_amounts(
+    cust_income: int,
+    noncust_income: int,
+    age_idxs: Sequence[int],
+    adjustments: Optional[Sequence[Adjustment]] = None,
+    applied: Optional[List[Dict[str, Any]]] = None,
+    standard_totals: Optional[Sequence[int]] = None,
+) -> _GuidelineAmounts:
+    """
+    Guideline arithmetic shared by every entry point: income bracket, standard total,
+    child-count multiplier, adjustments and the non-custodial payment. age_idxs must
+    already be validated. Audit entries for the adjustments are appended to `applied`
+    when given. standard_totals, if given, holds the standard total per income bracket
+    for those children (see make_specialized).
+    """
     if cust_income < 0 or noncust_income < 0:
         raise ValueError("Income cannot be negative.")
 
     combined = cust_income + noncust_income
-    combined_mw = combined // 10_000
     bracket_idx = Guideline2021.income_bracket_index(combined)
 
     # Standard support: sum of per-child averages from the table
-    cells: List[ChildCell] = []
-    standard_total = 0
-    for child in inputs.children:
-        cell = Guideline2021.cell(child.age, combined)
-        cells.append(cell)
-        standard_total += cell.avg_krw
-
-    # Child-count multiplier (baseline 2 children)
-    n = len(inputs.children)
-    if n == 1:
-        m = CHILD_COUNT_MULTIPLIERS[1]
-    elif n == 2:
-        m = CHILD_COUNT_MULTIPLIERS[2]
+    if standard_totals is not None:
+        standard_total = standard_totals[bracket_idx]
     else:
-        m = CHILD_COUNT_MULTIPLIERS[3]
+        avg = AVG_2021
+        standard_total = sum(avg[age_idx][bracket_idx] for age_idx in age_idxs)
 
-    adjusted_total = standard_total * m
+    # Child-count multiplier (baseline 2 children)
+    num, den = CHILD_COUNT_MULT_FRAC[min(len(age_idxs), 3)]
+    adjusted_total = _round_div(standard_total * num, den)
 
-    # Apply user-provided adjustments
-    applied: List[Dict[str, Any]] = []
-    for a in adj:
-        if a.type == "multiplier":
-            if a.is_percent:
-                adjusted_total *= (1.0 + a.value)
-                applied.append({**asdict(a), "effective_multiplier": 1.0 + a.value})
-            else:
-                adjusted_total *= a.value
-                applied.append({**asdict(a), "effective_multiplier": a.value})
-        elif a.type == "add":
-            adjusted_total += a.value
-            applied.append({**asdict(a), "effective_add_krw": a.value})
-        elif a.type == "subtract":
-            adjusted_total -= a.value
-            applied.append({**asdict(a), "effective_subtract_krw": a.value})
-        else:
-            raise ValueError(f"Unknown adjustment type: {a.type}")
+    # Apply user-provided adjustments (the total only becomes a float if an adjustment value is one)
+    for a in adjustments or ():
+        mul, add, audit_key, audit_value = _mul_add(a)
+        adjusted_total = adjusted_total * mul + add
+        if applied is not None:
+            applied.append({**_adjustment_dict(a), audit_key: audit_value})
 
     adjusted_total = max(0, adjusted_total)
 
     # Allocation by income proportion (non-custodial share)
-    if combined == 0:
-        # Degenerate case: both 0. In practice, courts may impute income.
-        # Here we return 0 share and 0 payment.
-        noncust_share = 0.0
+    if isinstance(adjusted_total, int):
+        payment = 0 if combined == 0 else _round_div(adjusted_total * noncust_income, combined)
     else:
-        noncust_share = noncust_income / combined
-
-    payment = _safe_int(adjusted_total * noncust_share)
+        payment = _safe_int(adjusted_total * _noncust_share(noncust_income, combined))
+        adjusted_total = _safe_int(adjusted_total)
+
+    return _GuidelineAmounts(combined, bracket_idx, standard_total, (num, den), adjusted_total, payment)
+
+def _calculate(
+    cust_income: int,
+    noncust_income: int,
+    age_idxs: Sequence[int],
+    adjustments: Optional[Sequence[Adjustment]],
+    include_cells: bool,
+    standard_totals: Optional[Sequence[int]] = None,
+    cells_by_bracket: Optional[Sequence[Tuple[ChildCell, ...]]] = None,
+) -> CalculationBreakdown:
+    # Shared by calculate_child_support and make_specialized; age_idxs are already validated.
+    applied: List[Dict[str, Any]] = []
+    amounts = _guideline_amounts(cust_income, noncust_income, age_idxs, adjustments, applied, standard_totals)
+    bracket_idx = amounts.bracket_idx
+    num, den = amounts.child_count_mult
+
+    if not include_cells:
+        cells = []
+    elif cells_by_bracket is not None:
+        cells = list(cells_by_bracket[bracket_idx])
+    else:
+        cell_by_idx = Guideline2021.cell_by_idx
+        cells = [cell_by_idx(age_idx, bracket_idx) for age_idx in age_idxs]
 
     return CalculationBreakdown(
-        combined_income_krw=int(combined),
-        combined_income_mw=int(combined_mw),
+        combined_income_krw=int(amounts.combined),
+        combined_income_mw=int(amounts.combined // 10_000),
         income_bracket_index=int(bracket_idx),
         standard_children_cells=cells,
-        standard_total_krw=int(standard_total),
-        child_count_multiplier=float(m),
-        adjusted_total_krw=_safe_int(adjusted_total),
-        non_custodial_share=float(noncust_share),
-        non_custodial_payment_krw=int(payment),
+        standard_total_krw=int(amounts.standard_total),
+        child_count_multiplier=num / den,
+        adjusted_total_krw=int(amounts.adjusted_total),
+        non_custodial_share=_noncust_share(noncust_income, amounts.combined),
+        non_custodial_payment_krw=int(amounts.payment),
         applied_adjustments=applied,
     )
 
+def make_specialized(child_ages: Sequence[int]) -> Callable[..., CalculationBreakdown]:
+    """
+    Calculator specialized for a fixed set of child ages, for services that always score
+    the same family shape. Ages are validated once here, and the standard total and
+    cells for every income bracket are precomputed, so a call only looks them up by
+    bracket index instead of looping over the children. The returned function takes
+    (custodial_income_krw, non_custodial_income_krw, adjustments=(), *, include_cells=True)
+    and matches calculate_child_support without income imputation. Calculators are
+    cached per child_ages.
+    """
+    return _make_specialized(tuple(child_ages))
+
+@lru_cache(maxsize=128)
+def _make_specialized(child_ages: Tuple[int, ...]) -> Callable[..., CalculationBreakdown]:
+    if not child_ages:
+        raise ValueError("At least one child is required.")
+    age_idxs = tuple(Guideline2021.age_idx_for(age) for age in child_ages)
+    bracket_idxs = range(len(INCOME_BRACKETS_MW))
+    standard_totals = tuple(sum(AVG_2021[age_idx][b] for age_idx in age_idxs) for b in bracket_idxs)
+    cells_by_bracket = tuple(tuple(_cell_cached(age_idx, b) for age_idx in age_idxs) for b in bracket_idxs)
+
+    def calculate(
+        custodial_income_krw: int,
+        non_custodial_income_krw: int,
+        adjustments: Sequence[Adjustment] = (),
+        *,
+        include_cells: bool = True,
+    ) -> CalculationBreakdown:
+        return _calculate(
+            custodial_income_krw, non_custodial_income_krw, age_idxs, adjustments, include_cells,
+            standard_totals, cells_by_bracket,
+        )
+
+    return calculate
+
+def calculate_child_support_batch(
+    custodial_incomes_krw: Sequence[int],
+    non_custodial_incomes_krw: Sequence[int],
+    children_ages: Sequence[Sequence[int]],
+) -> List[int]:
+    """
+    Non-custodial payment (KRW) for many cases at once, e.g. regression runs or what-if
+    simulations. Row i uses custodial_incomes_krw[i], non_custodial_incomes_krw[i] and the
+    child ages in children_ages[i].
+
+    Equivalent to calculate_child_support(...).non_custodial_payment_krw without
+    adjustments or income imputation, but skips building the per-case breakdown.
+    """
+    if not (len(custodial_incomes_krw) == len(non_custodial_incomes_krw) == len(children_ages)):
+        raise ValueError("Batch inputs must have the same length.")
+
+    age_idx_for = Guideline2021.age_idx_for
+    payments: List[int] = []
+    for cust_income, noncust_income, ages in zip(custodial_incomes_krw, non_custodial_incomes_krw, children_ages):
+        if len(ages) == 0:  # not `not ages`: rows may be NumPy arrays
+            raise ValueError("At least one child is required.")
+        age_idxs = [age_idx_for(age) for age in ages]
+        payments.append(_guideline_amounts(cust_income, noncust_income, age_idxs).payment)
+    return payments
+
 # -----------------------------------------------------------------------------
 # CLI
 # -----------------------------------------------------------------------------
 
 def _parse_children_ages(s: str) -> List[Child]:
-    ages = []
-    for part in s.split(","):
-        part = part.strip()
-        if not part:
-            continue
-        ages.append(Child(age=int(part)))
-    if not ages:
+    # int() tolerates surrounding whitespace, so only blank parts need filtering.
+    children = [Child(int(part)) for part in s.split(",") if part.strip()]
+    if not children:
         raise ValueError("children_ages must be like: 8 or 8,15")
-    return ages
+    return children
+
+def _cell_to_jsonable(c: ChildCell) -> Dict[str, Any]:
+    return {
+        "age_label": c.age_label,
+        "income_bracket_mw": list(c.income_bracket_mw),
+        "avg_krw": c.avg_krw,
+        "low_krw": c.low_krw,
+        "high_krw": c.high_krw,
+    }
+
+def _breakdown_to_jsonable(out: CalculationBreakdown) -> Dict[str, Any]:
+    # Field-by-field equivalent of dataclasses.asdict(out), without its reflective deepcopy.
+    return {
+        "combined_income_krw": out.combined_income_krw,
+        "combined_income_mw": out.combined_income_mw,
+        "income_bracket_index": out.income_bracket_index,
+        "standard_children_cells": [_cell_to_jsonable(c) for c in out.standard_children_cells],
+        "standard_total_krw": out.standard_total_krw,
+        "child_count_multiplier": out.child_count_multiplier,
+        "adjusted_total_krw": out.adjusted_total_krw,
+        "non_custodial_share": out.non_custodial_share,
+        "non_custodial_payment_krw": out.non_custodial_payment_krw,
+        "applied_adjustments": out.applied_adjustments,
+    }
+
+def _dumps(obj: Any) -> str:
+    # orjson output is equivalent JSON, not byte-identical (e.g. 0.00001 vs 1e-05, NaN -> null).
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj, option=orjson.OPT_INDENT_2).decode()
+        except TypeError:  # e.g. integers beyond 64 bits
+            pass
+    return json.dumps(obj, ensure_ascii=False, indent=2)
 
 def main() -> None:
     p = argparse.ArgumentParser(description="Korean Child Support Calculator (2021 guideline)")
@@ -370,7 +565,7 @@ def main() -> None:
                         "'[{\"name\":\"urban\",\"type\":\"multiplier\",\"value\":0.05,\"is_percent\":true}]'")
     args = p.parse_args()
 
-    adjustments = None
+    adjustments: Sequence[Adjustment] = ()
     if args.adj_json:
         raw = json.loads(args.adj_json)
         adjustments = [Adjustment(**item) for item in raw]
@@ -382,7 +577,7 @@ def main() -> None:
         adjustments=adjustments,
     )
     out = calculate_child_support(inp)
-    print(json.dumps(asdict(out), ensure_ascii=False, indent=2))
+    print(_dumps(_breakdown_to_jsonable(out)))
 
 if __name__ == "__main__":
     main()